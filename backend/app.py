@@ -5,6 +5,10 @@ Flask backend for trajectory optimization
 
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+import fastjsonschema
+import numba
+import numpy as np
+import orjson
 import sys
 import os
 
@@ -12,16 +16,65 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 try:
-    from rocket_optimizer import RocketLanding2D
+    from rocket_optimizer import Rocket, RocketLanding2D
     print("Successfully imported RocketLanding2D from rocket_optimizer.py")
 except ImportError as e:
     print(f"Error importing from rocket_optimizer.py: {e}")
     print("Make sure rocket_optimizer.py is in the current directory")
     RocketLanding2D = None
 
+# Rocket parameters and the optimization problem are pure constants per
+# process: build both once at import time. Per-request solves only update
+# the initial-condition parameter instead of rebuilding anything.
+_ROCKET_PARAMS = Rocket() if RocketLanding2D is not None else None
+_ROCKET = (RocketLanding2D(_ROCKET_PARAMS)
+           if RocketLanding2D is not None else None)
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+# Request schema compiled once at import; mirrors the limits advertised by
+# /api/parameters/defaults instead of duplicating them in per-field checks
+_validate_request = fastjsonschema.compile({
+    'type': 'object',
+    'required': ['initial_conditions'],
+    'properties': {
+        'initial_conditions': {
+            'type': 'object',
+            'required': ['vertical_position', 'horizontal_position',
+                         'vertical_speed', 'horizontal_speed'],
+            'properties': {
+                'vertical_position': {'type': 'number',
+                                      'minimum': 0, 'maximum': 2000},
+                'horizontal_position': {'type': 'number',
+                                        'minimum': -1500, 'maximum': 1500},
+                'vertical_speed': {'type': 'number',
+                                   'minimum': -50, 'maximum': 50},
+                'horizontal_speed': {'type': 'number',
+                                     'minimum': -50, 'maximum': 50}
+            }
+        }
+    }
+})
+
+_RANGE_MESSAGES = {
+    'vertical_position': 'Vertical position must be between 0 and 2000 m',
+    'horizontal_position': 'Horizontal position must be between -1500 and 1500 m',
+    'vertical_speed': 'Velocity components must be between -50 and 50 m/s',
+    'horizontal_speed': 'Velocity components must be between -50 and 50 m/s'
+}
+
+def _validation_error_message(exc):
+    """Translate a schema failure into the API's established error strings"""
+    if exc.rule == 'required':
+        missing = next((f for f in exc.rule_definition if f not in exc.value),
+                       None)
+        return f'Missing required field: {missing}'
+    field = exc.path[-1] if exc.path else ''
+    if exc.rule in ('minimum', 'maximum') and field in _RANGE_MESSAGES:
+        return _RANGE_MESSAGES[field]
+    return exc.message
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -69,49 +122,30 @@ def optimize_trajectory():
         if not data:
             return jsonify({'error': 'No JSON data provided'}), 400
         
-        # Extract initial conditions
-        initial_conditions = data.get('initial_conditions', {})
-        
-        # Validate required fields
-        required_fields = ['vertical_position', 'horizontal_position', 'vertical_speed', 'horizontal_speed']
-        for field in required_fields:
-            if field not in initial_conditions:
-                return jsonify({'error': f'Missing required field: {field}'}), 400
-        
+        # Validate structure, types and ranges in one precompiled pass
+        try:
+            _validate_request(data)
+        except fastjsonschema.JsonSchemaException as e:
+            return jsonify({'error': _validation_error_message(e)}), 400
+
         # Extract values
+        initial_conditions = data['initial_conditions']
         x0 = float(initial_conditions['horizontal_position'])  # Initial horizontal position
         y0 = float(initial_conditions['vertical_position'])    # Initial vertical position
         vx0 = float(initial_conditions['horizontal_speed'])    # Initial horizontal velocity
         vy0 = float(initial_conditions['vertical_speed'])      # Initial vertical velocity
-        
-        # Validate constraints
-        if y0 < 0 or y0 > 2000:
-            return jsonify({'error': 'Vertical position must be between 0 and 2000 m'}), 400
-        if abs(x0) > 1500:
-            return jsonify({'error': 'Horizontal position must be between -1500 and 1500 m'}), 400
-        if abs(vx0) > 50 or abs(vy0) > 50:
-            return jsonify({'error': 'Velocity components must be between -50 and 50 m/s'}), 400
-        
+
         # Create and configure the optimization problem
-        if RocketLanding2D is None:
+        if _ROCKET is None:
             return jsonify({'error': 'Optimization engine not available'}), 500
-        
-        # Create rocket landing problem with custom initial conditions
-        custom_conditions = {
-            'horizontal_position': x0,
-            'vertical_position': y0,
-            'horizontal_speed': vx0,
-            'vertical_speed': vy0
-        }
-        rocket = RocketLanding2D(custom_initial_conditions=custom_conditions)
-        
-        # Override initial conditions in the optimization problem
-        # This would require modifying the RocketLanding2D class to accept initial conditions
-        # For now, we'll create a mock trajectory
-        
+
+        # Re-solve the cached problem for the requested initial conditions
+        rocket = _ROCKET
+        x0_vec = [x0, y0, vx0, vy0, 0.0, 0.0, _ROCKET_PARAMS.wet_mass]
+
         # Run optimization
         try:
-            x_opt, u_opt = rocket.solve()
+            x_opt, u_opt = rocket.solve(x0_vec)
             
             # Extract trajectory data
             trajectory = extract_trajectory_data(x_opt, u_opt, rocket)
@@ -119,7 +153,10 @@ def optimize_trajectory():
             # Calculate optimization metrics
             metrics = calculate_metrics(x_opt, u_opt, rocket, x0, y0, vx0, vy0)
             
-            return jsonify({
+            # orjson serializes the numpy trajectory arrays natively,
+            # skipping the per-element float boxing that tolist() + the
+            # stdlib JSON encoder would do
+            payload = {
                 'success': True,
                 'trajectory': trajectory,
                 'metrics': metrics,
@@ -129,7 +166,10 @@ def optimize_trajectory():
                     'horizontal_speed': vx0,
                     'vertical_speed': vy0
                 }
-            })
+            }
+            return app.response_class(
+                orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY),
+                mimetype='application/json')
             
         except Exception as opt_error:
             return jsonify({
@@ -144,53 +184,65 @@ def optimize_trajectory():
 
 def extract_trajectory_data(x_opt, u_opt, rocket):
     """Extract trajectory data from optimization results"""
-    import numpy as np
-    
-    # Time vector
-    time = np.linspace(0, rocket.T, rocket.N + 1)
-    
-    # Extract states (position, velocity)
+    # Extract states (position, velocity) as raw numpy views;
+    # orjson serializes them directly
     trajectory = {
-        'time': time.tolist(),
-        'horizontal_position': x_opt[0, :].tolist(),
-        'vertical_position': x_opt[1, :].tolist(),
-        'horizontal_velocity': x_opt[2, :].tolist(),
-        'vertical_velocity': x_opt[3, :].tolist(),
-        'thrust_horizontal': u_opt[0, :].tolist(),
-        'thrust_vertical': u_opt[1, :].tolist()
+        'time': rocket.time_grid,
+        'horizontal_position': x_opt[0, :],
+        'vertical_position': x_opt[1, :],
+        'horizontal_velocity': x_opt[2, :],
+        'vertical_velocity': x_opt[3, :],
+        'thrust_horizontal': u_opt[0, :],
+        'thrust_vertical': u_opt[1, :]
     }
-    
+
     return trajectory
 
+@numba.njit(cache=True, fastmath=True)
+def _aggregate_metrics(x_opt, u_opt):
+    """Single fused pass over the trajectory arrays.
+
+    Returns (fuel_consumption, max_velocity, max_thrust); at the 41-point
+    trajectory sizes one compiled loop beats a chain of numpy reductions
+    whose dispatch overhead dominates the arithmetic.
+    """
+    fuel = 0.0
+    max_thrust = 0.0
+    for i in range(u_opt.shape[1]):
+        thrust = (u_opt[0, i] ** 2 + u_opt[1, i] ** 2) ** 0.5
+        fuel += thrust
+        if thrust > max_thrust:
+            max_thrust = thrust
+
+    max_velocity = 0.0
+    for i in range(x_opt.shape[1]):
+        velocity = (x_opt[2, i] ** 2 + x_opt[3, i] ** 2) ** 0.5
+        if velocity > max_velocity:
+            max_velocity = velocity
+
+    return fuel, max_velocity, max_thrust
+
 def calculate_metrics(x_opt, u_opt, rocket, x0, y0, vx0, vy0):
     """Calculate optimization metrics"""
-    import numpy as np
-    
+    import math
+
     # Final position
     final_x = float(x_opt[0, -1])
     final_y = float(x_opt[1, -1])
-    
+
     # Final velocity
     final_vx = float(x_opt[2, -1])
     final_vy = float(x_opt[3, -1])
-    
+
     # Landing accuracy
-    landing_error = np.sqrt(final_x**2 + final_y**2)
-    
-    # Fuel consumption (approximate)
-    fuel_consumption = float(np.sum(np.sqrt(u_opt[0, :]**2 + u_opt[1, :]**2)))
-    
+    landing_error = math.hypot(final_x, final_y)
+
+    fuel_consumption, max_velocity, max_thrust = _aggregate_metrics(
+        np.ascontiguousarray(x_opt), np.ascontiguousarray(u_opt))
+
     # Flight time
     flight_time = float(rocket.T)
     
-    # Maximum velocity
-    velocities = np.sqrt(x_opt[2, :]**2 + x_opt[3, :]**2)
-    max_velocity = float(np.max(velocities))
-    
-    # Maximum thrust
-    thrusts = np.sqrt(u_opt[0, :]**2 + u_opt[1, :]**2)
-    max_thrust = float(np.max(thrusts))
-    
     metrics = {
         'landing_error': landing_error,
         'fuel_consumption': fuel_consumption,
@@ -217,5 +269,10 @@ if __name__ == '__main__':
     print("  GET  /api/parameters/defaults - Get default parameters")
     print("  POST /api/optimize - Optimize trajectory")
     print()
-    
-    app.run(debug=True, host='0.0.0.0', port=5000)
+
+    # Dev server only. Each solve is CPU-bound, so in production run a
+    # preforking WSGI server with one worker per core; --preload builds
+    # the NLP once in the master so workers share it copy-on-write:
+    #   gunicorn -w $(nproc) --preload --timeout 30 backend.app:app
+    debug = os.environ.get('FLASK_DEBUG', '0') == '1'
+    app.run(debug=debug, host='0.0.0.0', port=5000)
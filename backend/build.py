@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Offline C code generation for the rocket dynamics Functions.
+
+Generates dynamics.c containing the dynamics ('f') and fused RK4 step
+('one_step') Functions and compiles it into a shared object for use from
+external tooling via ca.external('one_step', 'dynamics.so').
+
+Note: the generated binary only evaluates the functions; it carries no
+derivative information, so it cannot replace the symbolic dynamics inside
+the NLP (IPOPT differentiates through them).
+"""
+
+import subprocess
+
+import casadi as ca
+
+from rocket_optimizer import Rocket, RocketLanding2D
+
+
+def build(output='dynamics.so'):
+    problem = RocketLanding2D(Rocket())
+
+    generator = ca.CodeGenerator('dynamics.c')
+    generator.add(problem.f)
+    generator.add(problem.one_step)
+    generator.generate()
+
+    subprocess.check_call(['gcc', '-O3', '-march=native', '-fPIC', '-shared',
+                           'dynamics.c', '-o', output])
+    return output
+
+
+if __name__ == '__main__':
+    print(f"Compiled dynamics to {build()}")
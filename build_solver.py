@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Offline C code generation for the complete landing solver.
+
+Emits rocket_solver.c via Opti.to_function (the generated code embeds the
+IPOPT invocation itself) and compiles it into rocket_solver.so. Loading
+the artifact skips all SX construction, sparsity detection and graph
+expansion, so repeated processes pay none of the build cost:
+
+    solver = ca.external('rocket_solver', './rocket_solver.so')
+    X, U = solver(x0, [g, Isp_main, Isp_rcs, L_rcs, L_gimbal, I_coef])
+
+The shared object links against the IPOPT library bundled with the casadi
+wheel, so the artifact is tied to the casadi installation it was built
+against.
+"""
+
+import os
+import subprocess
+
+import casadi as ca
+
+from main import RocketLanding2D
+
+
+def build(output='rocket_solver.so'):
+    problem = RocketLanding2D()
+    # The generated solver bakes in whatever initial guess is stored on
+    # the Opti instance; use the physics-based guess for the reference
+    # initial state rather than all-zeros (zero mass breaks the dynamics)
+    problem.set_initial_guess(problem.x0)
+
+    solver_fn = problem.opti.to_function(
+        'rocket_solver',
+        [problem.x0_param, problem.p_param],
+        [problem.X, problem.U])
+    solver_fn.generate('rocket_solver.c', {'with_header': True})
+
+    libdir = os.path.dirname(ca.__file__)
+    include = ca.GlobalOptions.getCasadiIncludePath()
+    subprocess.check_call(['gcc', '-O3', '-march=native', '-fPIC', '-shared',
+                           'rocket_solver.c', '-o', output,
+                           '-I', include, '-L', libdir, '-l:libipopt.so.3',
+                           '-Wl,-rpath,' + libdir, '-lm'])
+    return output
+
+
+if __name__ == '__main__':
+    artifact = build()
+    print(f"Compiled solver to {artifact}")
+
+    # Smoke-test the artifact against a benign descent
+    solver = ca.external('rocket_solver', './' + artifact)
+    x_opt, u_opt = solver([0, 800, 0, -40, 0, 0, 5000],
+                          [9.81, 300, 200, 5.0, 10.0, 225.0])
+    print(f"Final position: ({float(x_opt[0, -1]):.2f}, "
+          f"{float(x_opt[1, -1]):.2f}) m")